@@ -1,16 +1,20 @@
 #!/usr/bin/env python3
 """
-Flask web server for Azure CLI Chat Assistant
+Quart web server for Azure CLI Chat Assistant
 Serves the web interface and provides API endpoints for chat functionality
 """
 
 import os
 import asyncio
-import json
+import time
 from datetime import datetime
-from typing import Dict, Any
-from flask import Flask, render_template, request, jsonify, send_from_directory
-from flask_cors import CORS
+from typing import Awaitable, Callable, Dict, Any, Optional, Tuple
+from quart import Quart, Response, request, send_from_directory
+from quart_cors import cors
+from ulid import ULID
+import msgspec
+import orjson
+import redis.asyncio as redis
 import logging
 
 # Import the existing MCP client
@@ -20,24 +24,112 @@ from main import MCPClient
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, static_folder='static', static_url_path='')
-CORS(app)
+# Quart serves every request on one event loop, the same loop that owns the MCP stdio session
+app = cors(Quart(__name__, static_folder='static', static_url_path=''))
+
+# Bound once so per-request timestamps skip the attribute lookup
+_utcnow = datetime.utcnow
+
+class Session(msgspec.Struct):
+    """Per-conversation state, also the msgpack schema for the Redis store"""
+    created_at: datetime
+    message_count: int = 0
+    last_activity: Optional[datetime] = None
 
 # Global variables
 mcp_client: MCPClient = None
-chat_sessions: Dict[str, Any] = {}
+chat_sessions: Dict[str, Session] = {}
+
+# Sessions live in Redis when REDIS_URL is set so they are shared between workers,
+# otherwise they fall back to the in-process chat_sessions dict
+REDIS_URL = os.environ.get('REDIS_URL')
+SESSION_TTL = 3600
+redis_client: Optional[redis.Redis] = redis.Redis.from_url(REDIS_URL) if REDIS_URL else None
+
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+JSON_MIMETYPE = 'application/json'
+
+# Health and status payloads are rebuilt at most once per SNAPSHOT_TTL seconds
+SNAPSHOT_TTL = 1.0
+_snapshots: Dict[Tuple[str, str], Tuple[float, bytes, int]] = {}
+
+def _response_mimetype() -> str:
+    return MSGPACK_MIMETYPE if MSGPACK_MIMETYPE in request.headers.get('Accept', '') else JSON_MIMETYPE
+
+def _encode(data: Dict[str, Any], mimetype: str) -> bytes:
+    return msgspec.msgpack.encode(data) if mimetype == MSGPACK_MIMETYPE else orjson.dumps(data)
+
+def respond(data: Dict[str, Any], status: int = 200):
+    """Serialize a response body as MessagePack if the client accepts it, JSON (via orjson) otherwise"""
+    mimetype = _response_mimetype()
+    return Response(_encode(data, mimetype), status=status, mimetype=mimetype)
+
+async def respond_snapshot(name: str, build: Callable[[], Awaitable[Tuple[Dict[str, Any], int]]]):
+    """Serve a pre-serialized payload, awaiting build() only when the cached one is stale"""
+    mimetype = _response_mimetype()
+    now = time.monotonic()
+    cached = _snapshots.get((name, mimetype))
+    if cached is None or now - cached[0] >= SNAPSHOT_TTL:
+        data, status = await build()
+        cached = (now, _encode(data, mimetype), status)
+        _snapshots[(name, mimetype)] = cached
+    return Response(cached[1], status=cached[2], mimetype=mimetype)
+
+def _session_key(conversation_id: str) -> str:
+    return f"sess:{conversation_id}"
+
+async def load_session(conversation_id: str) -> Optional[Session]:
+    """Fetch a chat session, or None if it does not exist"""
+    if redis_client is None:
+        return chat_sessions.get(conversation_id)
+    raw = await redis_client.get(_session_key(conversation_id))
+    return msgspec.msgpack.decode(raw, type=Session) if raw is not None else None
+
+async def store_session(conversation_id: str, session: Session):
+    """Persist a chat session and refresh its expiry"""
+    if redis_client is None:
+        chat_sessions[conversation_id] = session
+        return
+    await redis_client.set(_session_key(conversation_id), msgspec.msgpack.encode(session), ex=SESSION_TTL)
+
+async def delete_session(conversation_id: str) -> bool:
+    """Remove a chat session, returning whether it existed"""
+    if redis_client is None:
+        return chat_sessions.pop(conversation_id, None) is not None
+    return await redis_client.delete(_session_key(conversation_id)) > 0
+
+async def count_sessions() -> int:
+    """Count the active chat sessions"""
+    if redis_client is None:
+        return len(chat_sessions)
+    return len([key async for key in redis_client.scan_iter(match=_session_key('*'), count=1000)])
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events frame"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {orjson.dumps(data).decode()}\n\n"
 
 def get_or_create_session_id() -> str:
-    """Generate a unique session ID for conversation tracking"""
-    import uuid
-    return str(uuid.uuid4())
+    """Generate a unique, time-ordered session ID for conversation tracking"""
+    return str(ULID())
+
+def enable_eager_tasks(loop: asyncio.AbstractEventLoop):
+    """Run new tasks eagerly until they first block (Python 3.12+)"""
+    if hasattr(asyncio, 'eager_task_factory'):
+        loop.set_task_factory(asyncio.eager_task_factory)
 
 async def initialize_mcp_client():
     """Initialize the MCP client connection"""
     global mcp_client
     try:
         mcp_client = MCPClient()
-        await mcp_client.connect_to_azure_cli_server()
+        # Prime the Claude connection pool while the MCP server starts up. The MCP
+        # connection stays in this task so its contexts are exited where they were entered.
+        warm_up = asyncio.create_task(mcp_client.warm_up())
+        try:
+            await mcp_client.connect_to_azure_cli_server()
+        finally:
+            await warm_up
         logger.info("MCP client initialized successfully")
         return True
     except Exception as e:
@@ -45,58 +137,60 @@ async def initialize_mcp_client():
         return False
 
 @app.route('/')
-def index():
+async def index():
     """Serve the main chat interface"""
-    return send_from_directory('static', 'index.html')
+    return await send_from_directory('static', 'index.html')
 
 @app.route('/health')
-def health_check():
+async def health_check():
     """Health check endpoint"""
+    return await respond_snapshot('health', _build_health)
+
+async def _build_health():
     global mcp_client
     is_healthy = mcp_client is not None and mcp_client.session is not None
-    return jsonify({
+    return {
         'status': 'healthy' if is_healthy else 'unhealthy',
-        'timestamp': datetime.utcnow().isoformat(),
+        'timestamp': _utcnow().isoformat(),
         'mcp_connected': is_healthy
-    }), 200 if is_healthy else 503
+    }, 200 if is_healthy else 503
 
 @app.route('/api/chat', methods=['POST'])
 async def chat():
     """Handle chat messages and return responses"""
-    global mcp_client, chat_sessions
+    global mcp_client
     
     try:
         # Parse request
-        data = request.get_json()
+        data = await request.get_json()
         if not data or 'message' not in data:
-            return jsonify({
+            return respond({
                 'success': False,
                 'error': 'Message is required'
-            }), 400
+            }, 400)
         
         message = data['message'].strip()
         if not message:
-            return jsonify({
+            return respond({
                 'success': False,
                 'error': 'Message cannot be empty'
-            }), 400
+            }, 400)
         
         # Get or create conversation ID
         conversation_id = data.get('conversation_id', get_or_create_session_id())
         
         # Initialize session if needed
-        if conversation_id not in chat_sessions:
-            chat_sessions[conversation_id] = {
-                'created_at': datetime.utcnow(),
-                'message_count': 0
-            }
+        session = await load_session(conversation_id)
+        if session is None:
+            session = Session(created_at=_utcnow())
+            await store_session(conversation_id, session)
         
         # Check if MCP client is available
         if not mcp_client or not mcp_client.session:
-            return jsonify({
+            return respond({
                 'success': False,
                 'error': 'Azure CLI service is not available. Please check your connection.'
-            }), 503
+            }, 503)
         
         # Process the message
         logger.info(f"Processing message for conversation {conversation_id}: {message[:100]}...")
@@ -105,13 +199,14 @@ async def chat():
             response = await mcp_client.process_query(message)
             
             # Update session
-            chat_sessions[conversation_id]['message_count'] += 1
-            chat_sessions[conversation_id]['last_activity'] = datetime.utcnow()
+            session.message_count += 1
+            session.last_activity = _utcnow()
+            await store_session(conversation_id, session)
             
             # Generate message ID
-            message_id = f"{conversation_id}_{chat_sessions[conversation_id]['message_count']}"
+            message_id = f"{conversation_id}_{session.message_count}"
             
-            return jsonify({
+            return respond({
                 'success': True,
                 'data': {
                     'response': response,
@@ -122,76 +217,138 @@ async def chat():
             
         except Exception as e:
             logger.error(f"Error processing query: {e}")
-            return jsonify({
+            return respond({
                 'success': False,
                 'error': f'Failed to process your request: {str(e)}'
-            }), 500
+            }, 500)
             
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
-        return jsonify({
+        return respond({
             'success': False,
             'error': 'Internal server error'
-        }), 500
+        }, 500)
+
+@app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Handle chat messages and stream the response as Server-Sent Events"""
+    global mcp_client
+    
+    data = await request.get_json(silent=True)
+    if not data or 'message' not in data:
+        return respond({
+            'success': False,
+            'error': 'Message is required'
+        }, 400)
+    
+    message = data['message'].strip()
+    if not message:
+        return respond({
+            'success': False,
+            'error': 'Message cannot be empty'
+        }, 400)
+    
+    if not mcp_client or not mcp_client.session:
+        return respond({
+            'success': False,
+            'error': 'Azure CLI service is not available. Please check your connection.'
+        }, 503)
+    
+    conversation_id = data.get('conversation_id', get_or_create_session_id())
+    session = await load_session(conversation_id) or Session(created_at=_utcnow())
+    
+    logger.info(f"Streaming message for conversation {conversation_id}: {message[:100]}...")
+    
+    async def generate():
+        query = mcp_client.process_query_stream(message)
+        try:
+            async for kind, payload in query:
+                if kind == 'text':
+                    yield sse_event({'delta': payload})
+                else:
+                    yield sse_event(payload, event=kind)
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}")
+            yield sse_event({'error': f'Failed to process your request: {str(e)}'}, event='error')
+            return
+        finally:
+            # Release the client's query lock now if the client disconnected mid-stream,
+            # rather than whenever the abandoned generator is garbage collected
+            await query.aclose()
+        
+        session.message_count += 1
+        session.last_activity = _utcnow()
+        await store_session(conversation_id, session)
+        
+        yield sse_event({
+            'conversation_id': conversation_id,
+            'message_id': f"{conversation_id}_{session.message_count}"
+        }, event='done')
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/conversations/<conversation_id>', methods=['DELETE'])
-def clear_conversation(conversation_id: str):
+async def clear_conversation(conversation_id: str):
     """Clear a specific conversation"""
-    global chat_sessions
-    
-    if conversation_id in chat_sessions:
-        del chat_sessions[conversation_id]
+    if await delete_session(conversation_id):
         logger.info(f"Cleared conversation {conversation_id}")
     
-    return jsonify({
+    return respond({
         'success': True,
         'message': 'Conversation cleared'
     })
 
 @app.route('/api/status')
-def get_status():
+async def get_status():
     """Get detailed system status"""
-    global mcp_client, chat_sessions
+    return await respond_snapshot('status', _build_status)
+
+async def _build_status():
+    global mcp_client
     
+    session_count = await count_sessions()
     mcp_status = {
         'connected': mcp_client is not None and mcp_client.session is not None,
-        'session_count': len(chat_sessions)
+        'session_count': session_count
     }
     
     if mcp_client and hasattr(mcp_client, 'conversation_history'):
         mcp_status['conversation_length'] = len(mcp_client.conversation_history)
     
-    return jsonify({
+    return {
         'status': 'running',
-        'timestamp': datetime.utcnow().isoformat(),
+        'timestamp': _utcnow().isoformat(),
         'mcp': mcp_status,
-        'active_sessions': len(chat_sessions)
-    })
+        'active_sessions': session_count
+    }, 200
 
 # Static file serving
 @app.route('/<path:filename>')
-def serve_static(filename):
+async def serve_static(filename):
     """Serve static files"""
-    return send_from_directory('static', filename)
+    return await send_from_directory('static', filename)
 
 # Error handlers
 @app.errorhandler(404)
-def not_found(error):
-    return jsonify({
+async def not_found(error):
+    return respond({
         'success': False,
         'error': 'Endpoint not found'
-    }), 404
+    }, 404)
 
 @app.errorhandler(500)
-def internal_error(error):
-    return jsonify({
+async def internal_error(error):
+    return respond({
         'success': False,
         'error': 'Internal server error'
-    }), 500
+    }, 500)
 
+@app.before_serving
 async def startup():
     """Initialize the application"""
     logger.info("Starting Azure CLI Chat Assistant...")
+    enable_eager_tasks(asyncio.get_running_loop())
     
     # Initialize MCP client
     success = await initialize_mcp_client()
@@ -200,25 +357,31 @@ async def startup():
     
     logger.info("Application startup complete")
 
+@app.after_serving
+async def shutdown():
+    """Close the MCP connection and Redis pool on the loop that opened them"""
+    if mcp_client:
+        await mcp_client.cleanup()
+    if redis_client is not None:
+        await redis_client.aclose()
+
 def main():
     """Main entry point"""
     import sys
     
-    # Set up event loop for Windows
+    # Set up event loop for Windows, use uvloop everywhere else
     if sys.platform.startswith('win'):
         asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    else:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     
-    # Initialize async components
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(startup())
-    
-    # Start the Flask app
+    # Start the Quart app; startup() runs on its event loop before serving
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('DEBUG', 'False').lower() == 'true'
     
     logger.info(f"Starting web server on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=debug, threaded=True)
+    app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=debug)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -12,21 +12,23 @@ import shutil
 from pathlib import Path
 
 def run_command(command, cwd=None):
-    """Run a command and return success status"""
+    """Run a command given as an argv list (no shell) and return success status"""
     try:
-        print(f"Running: {command}")
-        result = subprocess.run(command, shell=True, cwd=cwd, check=True)
+        print(f"Running: {' '.join(command)}")
+        # Resolve the executable ourselves so npm.cmd/npx.cmd are found on Windows without a shell
+        executable = shutil.which(command[0]) or command[0]
+        subprocess.check_call([executable, *command[1:]], cwd=cwd)
         return True
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, OSError) as e:
         print(f"Error running command: {e}")
         return False
 
 def ensure_node_modules():
     """Ensure node modules are installed"""
-    website_dir = Path('website')
-    if not (website_dir / 'node_modules').exists() or not (website_dir / 'node_modules' / 'typescript').exists():
+    # One stat answers both "is node_modules there" and "is typescript installed"
+    if not (Path('website') / 'node_modules' / 'typescript').is_dir():
         print("Installing Node.js dependencies...")
-        return run_command('npm install', cwd='website')
+        return run_command(['npm', 'install'], cwd='website')
     return True
 
 def compile_typescript():
@@ -37,7 +39,7 @@ def compile_typescript():
     Path('website/static/dist').mkdir(parents=True, exist_ok=True)
     
     # Run TypeScript compiler from website directory
-    return run_command('npx tsc', cwd='website')
+    return run_command(['npx', 'tsc'], cwd='website')
 
 def copy_assets():
     """Copy any additional assets if needed"""
@@ -86,7 +88,7 @@ def main():
     
     if not build_only:
         print("Starting the web server...")
-        # Import and run the Flask app
+        # Import and run the Quart app
         try:
             from website_app import main as run_app
             run_app()
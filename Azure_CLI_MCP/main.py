@@ -1,16 +1,21 @@
 import asyncio
-import json
 import os
 import sys
+import time
+from pathlib import Path
 from typing import Optional
 from contextlib import AsyncExitStack
 
+import msgspec
+import orjson
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
 
+from prompts import SUMMARY_PROMPT
+
 load_dotenv()  # load environment variables from .env
 
 
@@ -19,26 +24,64 @@ AZURE_CLIENT_ID=os.getenv("AZURE_CLIENT_ID")
 AZURE_CLIENT_SECRET=os.getenv("AZURE_CLIENT_SECRET")
 AZURE_SUBSCRIPTION_ID=os.getenv("AZURE_SUBSCRIPTION_ID")
 
+# Credentials JSON built once from the individual env vars, if they are all set
+_AZURE_CREDENTIALS_JSON = None
+if all([AZURE_CLIENT_ID, AZURE_CLIENT_SECRET, AZURE_SUBSCRIPTION_ID, AZURE_TENANT_ID]):
+    _AZURE_CREDENTIALS_JSON = orjson.dumps({
+        "clientId": AZURE_CLIENT_ID,
+        "clientSecret": AZURE_CLIENT_SECRET,
+        "subscriptionId": AZURE_SUBSCRIPTION_ID,
+        "tenantId": AZURE_TENANT_ID,
+        "activeDirectoryEndpointUrl": "https://login.microsoftonline.com",
+        "resourceManagerEndpointUrl": "https://management.azure.com/",
+        "activeDirectoryGraphResourceId": "https://graph.windows.net/",
+        "sqlManagementEndpointUrl": "https://management.core.windows.net:8443/",
+        "galleryEndpointUrl": "https://gallery.azure.com/",
+        "managementEndpointUrl": "https://management.core.windows.net/"
+    }).decode()
+
+# Tool schemas change rarely, so reuse the last listing across restarts
+TOOLS_CACHE_FILE = Path.home() / ".cache" / "azure_cli_mcp" / "tools.msgpack"
+TOOLS_CACHE_MAX_AGE = 3600  # seconds
+
 class MCPClient:
     def __init__(self):
         # Initialize session and client objects
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
-        self.anthropic = Anthropic()
+        # Reuse pooled HTTP/2 connections across every Claude request
+        self._http = DefaultAsyncHttpxClient(http2=True, timeout=60)
+        self.anthropic = AsyncAnthropic(http_client=self._http)
         self.conversation_history = []
+        self.query_lock = asyncio.Lock()  # Held for a whole query, see process_query
         self.available_tools = []
+        self._tools_refresh: Optional[asyncio.Task] = None
+        self._tools_fetched_at: Optional[float] = None  # time.monotonic() of the last listing
         self.max_iterations = 10
+        self.model = "claude-3-5-sonnet-20241022"
+        self.max_tokens = 1000
+        self.max_history_tokens = 8000  # Summarize older turns past this estimate
+        self.keep_recent_turns = 4
+        # The synthetic summary message heading the history after a compaction, and its text
+        self._summary_message: Optional[dict] = None
+        self._summary = ""
         self.debug = True  # Enable debug mode
         
         
     def log_debug(self, message: str, data=None):
-        """Debug logging helper"""
+        """Debug logging helper
+        
+        data may be a zero-argument callable so expensive payloads are only
+        built when debug mode is on.
+        """
         if self.debug:
             print(f"[DEBUG] {message}")
+            if callable(data):
+                data = data()
             if data is not None:
                 try:
                     if isinstance(data, (dict, list)):
-                        print(f"[DEBUG] Data: {json.dumps(data, indent=2, default=str)}")
+                        print(f"[DEBUG] Data: {orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS, default=str).decode()}")
                     else:
                         print(f"[DEBUG] Data: {data}")
                 except Exception as e:
@@ -54,25 +97,8 @@ class MCPClient:
         try:
             self.log_debug("Starting Azure CLI MCP server connection...")
             
-            # Try to get credentials from parameter first, then environment variable
-            if azure_credentials is None:
-                azure_credentials = os.getenv('AZURE_CREDENTIALS')
-            
-            # If still no credentials, try to build from individual env vars
-            if not azure_credentials and all([AZURE_CLIENT_ID, AZURE_CLIENT_SECRET, AZURE_SUBSCRIPTION_ID, AZURE_TENANT_ID]):
-                credentials_dict = {
-                    "clientId": AZURE_CLIENT_ID,
-                    "clientSecret": AZURE_CLIENT_SECRET,
-                    "subscriptionId": AZURE_SUBSCRIPTION_ID,
-                    "tenantId": AZURE_TENANT_ID,
-                    "activeDirectoryEndpointUrl": "https://login.microsoftonline.com",
-                    "resourceManagerEndpointUrl": "https://management.azure.com/",
-                    "activeDirectoryGraphResourceId": "https://graph.windows.net/",
-                    "sqlManagementEndpointUrl": "https://management.core.windows.net:8443/",
-                    "galleryEndpointUrl": "https://gallery.azure.com/",
-                    "managementEndpointUrl": "https://management.core.windows.net/"
-                }
-                azure_credentials = json.dumps(credentials_dict)
+            # Try the parameter first, then the environment, then the individual env vars
+            azure_credentials = azure_credentials or os.getenv('AZURE_CREDENTIALS') or _AZURE_CREDENTIALS_JSON
             
             if not azure_credentials:
                 raise ValueError("Azure credentials are required. Set AZURE_CREDENTIALS environment variable or individual Azure credential env vars (AZURE_CLIENT_ID, AZURE_CLIENT_SECRET, AZURE_SUBSCRIPTION_ID, AZURE_TENANT_ID)")
@@ -94,7 +120,7 @@ class MCPClient:
                 env=env
             )
             
-            self.log_debug("Server parameters created", {
+            self.log_debug("Server parameters created", lambda: {
                 "command": command, 
                 "args": args,
                 "env_keys": list(env.keys()) if env else None
@@ -116,33 +142,128 @@ class MCPClient:
             self.log_debug(f"Error during server connection: {str(e)}")
             raise
         
+    async def warm_up(self):
+        """Open a pooled connection to the Anthropic API ahead of the first query"""
+        try:
+            await self.anthropic.models.list(limit=1)
+            self.log_debug("Anthropic connection warmed up")
+        except Exception as e:
+            self.log_debug(f"Anthropic warm-up failed: {str(e)}")
+    
     async def process_query(self, query: str) -> str:
         """Process a query using Claude and available tools"""         
-        # Add the new user message to conversation history
-        self.conversation_history.append({
-            "role": "user", 
-            "content": query
-        })
-        
-        iteration_count = 0
-        
-        while iteration_count < self.max_iterations:
-            try:
-                response = await self._get_response()
+        # Concurrent requests share conversation_history, so run one query at a time
+        async with self.query_lock:
+            # Add the new user message to conversation history
+            self.conversation_history.append({
+                "role": "user", 
+                "content": query
+            })
+            
+            # Tool round-trips only extend the current turn, which compaction keeps
+            # verbatim, so one check per query is enough
+            await self._compact_history_or_log()
+            
+            iteration_count = 0
+            
+            while iteration_count < self.max_iterations:
+                try:
+                    response = await self._get_response()
+                    
+                    if self._has_tool_calls(response):
+                        await self._process_tool_calls(response)
+                        iteration_count += 1
+                    else:
+                        self.conversation_history.append({
+                        "role": "assistant",
+                        "content": response.content
+                        })
+                        
+                        return ''.join(block.text for block in response.content if block.type == "text")
+                        
+                except Exception as e:
+                    return f"Error processing query: {str(e), sys.exc_info()[2].tb_lineno}" 
+    
+    async def process_query_stream(self, query: str):
+        """Process a query like process_query, yielding output as Claude streams it
+            
+        Yields ("text", delta) for response text and ("tool_use", {...}) for each tool call.
+        """
+        # Concurrent requests share conversation_history, so run one query at a time
+        async with self.query_lock:
+            self.conversation_history.append({
+                "role": "user",
+                "content": query
+            })
+            
+            await self._compact_history_or_log()
+            
+            iteration_count = 0
+            
+            while iteration_count < self.max_iterations:
+                async with self.anthropic.messages.stream(**self._request_args()) as stream:
+                    async for text in stream.text_stream:
+                        yield "text", text
+                    response = await stream.get_final_message()
                 
                 if self._has_tool_calls(response):
+                    for block in response.content:
+                        if block.type == "tool_use":
+                            yield "tool_use", {"name": block.name, "input": block.input}
                     await self._process_tool_calls(response)
                     iteration_count += 1
                 else:
                     self.conversation_history.append({
-                    "role": "assistant",
-                    "content": response.content
+                        "role": "assistant",
+                        "content": response.content
                     })
-                    
-                    return ''.join([textContent.text for textContent in response.content])
-                    
-            except Exception as e:
-                return f"Error processing query: {str(e), sys.exc_info()[2].tb_lineno}" 
+                    return
+    
+    async def compact_history(self):
+        """Summarize older turns once the history grows past max_history_tokens
+        
+        The last keep_recent_turns user turns are kept verbatim so tool_use and
+        tool_result pairs are never split. A previous summary is not a turn: it is
+        folded into the new summary, and if only the recent turns are left nothing
+        is sent, however large they are.
+        """
+        history = self.conversation_history
+        if self._estimate_tokens(history) <= self.max_history_tokens:
+            return
+        
+        has_summary = bool(history) and history[0] is self._summary_message
+        start = 2 if has_summary else 0
+        turn_starts = [i for i in range(start, len(history))
+                       if history[i]["role"] == "user" and isinstance(history[i]["content"], str)]
+        if len(turn_starts) <= self.keep_recent_turns:
+            return
+        
+        split = turn_starts[-self.keep_recent_turns]
+        older, recent = history[start:split], history[split:]
+        transcript = "\n\n".join(f"{message['role']}: {self._content_text(message['content'])}" for message in older)
+        if has_summary:
+            transcript = f"Summary of the conversation before this point: {self._summary}\n\n{transcript}"
+        
+        self.log_debug(f"Summarizing {len(older)} messages of conversation history")
+        response = await self.anthropic.messages.create(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            messages=[{"role": "user", "content": SUMMARY_PROMPT + transcript}]
+        )
+        self._summary = ''.join(block.text for block in response.content if block.type == "text")
+        self._summary_message = {"role": "user", "content": f"Summary of our earlier conversation: {self._summary}"}
+        
+        self.conversation_history = [
+            self._summary_message,
+            {"role": "assistant", "content": "Understood, I will keep that context in mind."},
+            *recent
+        ]
+    
+    async def _compact_history_or_log(self):
+        try:
+            await self.compact_history()
+        except Exception as e:
+            self.log_debug(f"Could not compact conversation history: {str(e)}")
     
     async def chat_loop(self):
         """Run an interactive chat loop"""
@@ -178,19 +299,44 @@ class MCPClient:
         try:
             self.log_debug("Starting cleanup...")
             await self.exit_stack.aclose()
+            await self._http.aclose()
             self.log_debug("Cleanup completed")
         except Exception as e:
             self.log_debug(f"Error during cleanup: {str(e)}")
             
+    def _request_args(self):
+        return {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "messages": self.conversation_history,
+            "tools": self.available_tools
+        }
+    
     async def _get_response(self):
-        response = self.anthropic.messages.create(
-                        model="claude-3-5-sonnet-20241022",
-                        max_tokens=1000,
-                        messages=self.conversation_history,
-                        tools=self.available_tools
-                    )
+        response = await self.anthropic.messages.create(**self._request_args())
         return response
         
+    def _content_text(self, content, block_limit: Optional[int] = 2000) -> str:
+        """Flatten message content into plain text, truncating blocks past block_limit (None keeps them whole)"""
+        if isinstance(content, str):
+            return content
+        
+        parts = []
+        for block in content:
+            if not isinstance(block, dict):
+                block = block.model_dump()
+            if block["type"] == "text":
+                parts.append(block["text"][:block_limit])
+            elif block["type"] == "tool_use":
+                parts.append(f"[tool call {block['name']}: {orjson.dumps(block['input']).decode()}]"[:block_limit])
+            elif block["type"] == "tool_result":
+                parts.append(f"[tool result: {self._content_text(block['content'], block_limit)}]"[:block_limit])
+        return "\n".join(parts)
+    
+    def _estimate_tokens(self, messages) -> int:
+        # Roughly four characters per token
+        return sum(len(self._content_text(message["content"], block_limit=None)) for message in messages) // 4
+    
     def _extract_content(self, response) -> str:
         """Extract text content from Claude's response"""
         content = response.content
@@ -201,13 +347,57 @@ class MCPClient:
                 text_content += block.text
         
     async def _initialize_tools(self):
+        cached_tools = self._load_cached_tools()
+        if cached_tools is not None:
+            self.available_tools = cached_tools
+            self._tools_fetched_at = time.monotonic()
+            self.log_debug(f"Loaded {len(cached_tools)} tools from {TOOLS_CACHE_FILE}")
+            # Revalidate against the server without holding up startup
+            self._tools_refresh = asyncio.create_task(self._refresh_tools())
+        else:
+            await self._fetch_tools()
+    
+    async def _fetch_tools(self):
         response = await self.session.list_tools()
-        print(await self.session.list_tools())
+        self.log_debug("Tools listed", lambda: [tool.name for tool in response.tools])
         self.available_tools = [{
                 "name": tool.name,
                 "description": tool.description,
                 "input_schema": tool.inputSchema
             } for tool in response.tools]
+        self._tools_fetched_at = time.monotonic()
+        self._save_cached_tools()
+    
+    async def get_tools(self, max_age: float = 300):
+        """Return the tool definitions, listing them again once they are older than max_age seconds"""
+        if self._tools_fetched_at is None or time.monotonic() - self._tools_fetched_at > max_age:
+            await self._fetch_tools()
+        return self.available_tools
+    
+    def invalidate_tools(self):
+        """Make the next get_tools() call list the server's tools again"""
+        self._tools_fetched_at = None
+    
+    async def _refresh_tools(self):
+        try:
+            await self._fetch_tools()
+        except Exception as e:
+            self.log_debug(f"Background tool refresh failed, keeping cached tools: {str(e)}")
+    
+    def _load_cached_tools(self):
+        try:
+            if time.time() - TOOLS_CACHE_FILE.stat().st_mtime > TOOLS_CACHE_MAX_AGE:
+                return None
+            return msgspec.msgpack.decode(TOOLS_CACHE_FILE.read_bytes())
+        except (OSError, msgspec.DecodeError):
+            return None
+    
+    def _save_cached_tools(self):
+        try:
+            TOOLS_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            TOOLS_CACHE_FILE.write_bytes(msgspec.msgpack.encode(self.available_tools))
+        except OSError as e:
+            self.log_debug(f"Could not write tool cache: {str(e)}")
         
     def _has_tool_calls(self, response):
         content = response.content
@@ -236,16 +426,33 @@ class MCPClient:
             "content": assisstant_content + tool_calls
         })
         
-        for block in content:
-            if block.type == "tool_use":
-                result = await self.session.call_tool(block.name, block.input)
-                self.conversation_history.append({
-                    "role": "user",
-                    "content": [{"type": "tool_result",
-                                "tool_use_id": block.id,
-                                "content": ''.join([textContent.text for textContent in result.content])
-                        }]
-                })
+        # Independent tool calls run concurrently; MCP request ids keep the replies apart
+        tool_blocks = [block for block in content if block.type == "tool_use"]
+        tool_results = None
+        try:
+            tool_results = await asyncio.gather(*[self._call_tool(block) for block in tool_blocks])
+        finally:
+            if tool_results is None:
+                # Cancelled mid-call, e.g. the client disconnected. Every tool_use still
+                # needs a result or the shared history is rejected by later requests.
+                tool_results = [self._tool_result(block, "Error executing tool: the request was cancelled")
+                                for block in tool_blocks]
+            self.conversation_history.append({
+                "role": "user",
+                "content": tool_results
+            })
+    
+    async def _call_tool(self, block):
+        """Run one tool call, returning its output or the error as a tool_result"""
+        try:
+            result = await self.session.call_tool(block.name, block.input)
+            return self._tool_result(block, ''.join(item.text for item in result.content if item.type == "text"))
+        except Exception as e:
+            self.log_debug(f"Error executing tool {block.name}: {str(e)}")
+            return self._tool_result(block, f"Error executing tool: {str(e)}")
+    
+    def _tool_result(self, block, content: str):
+        return {"type": "tool_result", "tool_use_id": block.id, "content": content}
     
     
 
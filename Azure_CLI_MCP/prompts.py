@@ -1,3 +1,5 @@
+from types import MappingProxyType
+
 BASE_PROMPT = """You are xxx, an expert AI assistant specializing in cloud infrastructure and architecture.
 You are a highly capable, thoughtful, and precise assistant. Your goal is to deeply understand the user's intent, ask clarifying questions when needed, think step-by-step through complex problems, provide clear and accurate answers, and proactively anticipate helpful follow-up information. Always prioritize being truthful, nuanced, insightful, and efficient, tailoring your responses specifically to the user's needs and preferences.
 You carry out your tasks by executing Azure CLI commands. You have the following rules:
@@ -26,6 +28,12 @@ Try not to mention you are using the Azure CLI, just answer the user's question.
 
 """
 
+SUMMARY_PROMPT = """Summarize the following conversation between a user and an Azure cloud assistant.
+Keep every detail needed to continue the conversation: the user's goals, resource names, subscriptions, regions, commands that were run and their important results, and any open questions.
+Reply with the summary only.
+
+"""
+
 INTRODUCTION_PROMPT = """Welcome to Fortress Cloud! I'm xxx, your personal ai assistant.
 I'm here to help you create and manage the optimal cloud infrastructure for your needs."""
 
@@ -39,4 +47,15 @@ CUPCAKE_FACTORY="""I have a cupcake factory and need help setting up software. E
 
 LANDSCAPING_BUSINESS="""I run a landscaping business and I need a cloud software system for saving documents and it should be able to connect to a website. Any advice on the cloud architecture I shoud employ?"""
 
-LAW_FIRM="""I'm a lawyer and I need to make could system where I can upload legal documents safely. Other employees should be able to access these files. The files need to be username and password protected."""
\ No newline at end of file
+LAW_FIRM="""I'm a lawyer and I need to make could system where I can upload legal documents safely. Other employees should be able to access these files. The files need to be username and password protected."""
+
+# Read-only registry for selecting a prompt by name
+PROMPTS = MappingProxyType({
+    "base": BASE_PROMPT,
+    "summary": SUMMARY_PROMPT,
+    "introduction": INTRODUCTION_PROMPT,
+    "tool": TOOL_PROMPT,
+    "cupcake_factory": CUPCAKE_FACTORY,
+    "landscaping_business": LANDSCAPING_BUSINESS,
+    "law_firm": LAW_FIRM
+})
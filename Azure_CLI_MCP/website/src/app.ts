@@ -56,6 +56,7 @@ class AzureChatApp {
   private getConfig(): ChatConfig {
     return {
       apiEndpoint: '/api/chat',
+      streamEndpoint: '/api/chat/stream',
       maxMessageLength: 2000,
       reconnectAttempts: 3,
       reconnectDelay: 5000,
@@ -1,11 +1,13 @@
 import { 
   ChatMessage, 
   ChatRequest, 
-  ChatResponse, 
   ConnectionStatus, 
   UIElements, 
   ChatConfig,
-  MessageOptions 
+  MessageOptions,
+  StreamDeltaEvent,
+  StreamDoneEvent,
+  StreamErrorEvent
 } from './types.js';
 
 export class ChatManager {
@@ -103,22 +105,34 @@ export class ChatManager {
       this.autoResizeTextarea();
       this.updateCharacterCount();
 
-      // Send to API
-      const response = await this.sendToAPI(message);
-      
-      if (response.success && response.data) {
-        const assistantMessage: ChatMessage = {
-          id: response.data.message_id,
-          role: 'assistant',
-          content: response.data.response,
-          timestamp: new Date(),
-          isMarkdown: true
-        };
-        
-        this.conversationId = response.data.conversation_id;
-        this.addMessage(assistantMessage, { animate: true });
-      } else {
-        this.addErrorMessage(response.error || 'Failed to get response');
+      // Stream the reply into an assistant bubble as it arrives
+      const assistantMessage: ChatMessage = {
+        id: this.generateId(),
+        role: 'assistant',
+        content: '',
+        timestamp: new Date(),
+        isMarkdown: true
+      };
+      const stream: { element: HTMLElement | null } = { element: null };
+
+      const done = await this.sendToStreamAPI(message, (delta) => {
+        if (!stream.element) {
+          this.showLoading(false);
+          stream.element = this.addMessage(assistantMessage, { animate: true });
+        }
+        assistantMessage.content += delta;
+        this.renderMessageText(stream.element, assistantMessage, false);
+        this.scrollToBottom();
+      });
+
+      if (stream.element) {
+        this.renderMessageText(stream.element, assistantMessage, true);
+      }
+
+      if (done) {
+        this.conversationId = done.conversation_id;
+        assistantMessage.id = done.message_id;
+        stream.element?.setAttribute('data-message-id', done.message_id);
       }
     } catch (error) {
       console.error('Error sending message:', error);
@@ -130,28 +144,102 @@ export class ChatManager {
     }
   }
 
-  private async sendToAPI(message: string): Promise<ChatResponse> {
+  private async sendToStreamAPI(
+    message: string,
+    onDelta: (delta: string) => void
+  ): Promise<StreamDoneEvent | null> {
     const request: ChatRequest = {
       message,
       ...(this.conversationId && { conversation_id: this.conversationId })
     };
 
-    const response = await fetch(this.config.apiEndpoint, {
+    const response = await fetch(this.config.streamEndpoint, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        'Accept': 'text/event-stream'
       },
       body: JSON.stringify(request)
     });
 
     if (!response.ok) {
+      // Validation and availability errors come back as a JSON body before streaming starts
+      const body = await response.json().catch(() => null) as StreamErrorEvent | null;
+      if (body?.error) {
+        this.addErrorMessage(body.error);
+        return null;
+      }
       throw new Error(`HTTP ${response.status}: ${response.statusText}`);
     }
 
-    return response.json() as Promise<ChatResponse>;
+    let done: StreamDoneEvent | null = null;
+    const handleFrame = (frame: string): void => {
+      let event = 'message';
+      let data = '';
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('event: ')) {
+          event = line.slice(7);
+        } else if (line.startsWith('data: ')) {
+          data += line.slice(6);
+        }
+      }
+      if (!data) return;
+
+      if (event === 'message') {
+        onDelta((JSON.parse(data) as StreamDeltaEvent).delta);
+      } else if (event === 'done') {
+        done = JSON.parse(data) as StreamDoneEvent;
+      } else if (event === 'error') {
+        this.addErrorMessage((JSON.parse(data) as StreamErrorEvent).error);
+      }
+    };
+
+    if (!response.body) {
+      // No streaming support: handle the whole event stream at once
+      (await response.text()).split('\n\n').forEach(handleFrame);
+      return done;
+    }
+
+    // Frames are separated by a blank line and may be split across chunks
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done: finished } = await reader.read();
+      if (finished) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        handleFrame(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+      }
+    }
+    handleFrame(buffer + decoder.decode());
+
+    return done;
+  }
+
+  private renderMessageText(messageElement: HTMLElement, message: ChatMessage, final: boolean): void {
+    const text = messageElement.querySelector('.message-text') as HTMLElement | null;
+    if (!text) return;
+
+    if (!final) {
+      // Plain text while streaming; markdown is formatted once the reply is complete
+      text.textContent = message.content;
+      return;
+    }
+
+    text.innerHTML = this.formatMarkdown(message.content);
+    text.querySelectorAll('pre code').forEach((block) => {
+      if (typeof window !== 'undefined' && window.hljs) {
+        window.hljs.highlightElement(block as HTMLElement);
+      }
+    });
   }
 
-  private addMessage(message: ChatMessage, options: MessageOptions = {}): void {
+  private addMessage(message: ChatMessage, options: MessageOptions = {}): HTMLElement {
     this.messages.push(message);
     
     const messageElement = this.createMessageElement(message);
@@ -172,6 +260,8 @@ export class ChatManager {
     if (options.scrollToBottom !== false) {
       this.scrollToBottom();
     }
+
+    return messageElement;
   }
 
   private createMessageElement(message: ChatMessage): HTMLElement {
@@ -28,6 +28,20 @@ export interface ChatResponse extends ApiResponse {
   };
 }
 
+// Server-Sent Events sent by /api/chat/stream
+export interface StreamDeltaEvent {
+  delta: string;
+}
+
+export interface StreamDoneEvent {
+  conversation_id: string;
+  message_id: string;
+}
+
+export interface StreamErrorEvent {
+  error: string;
+}
+
 export interface ConnectionStatus {
   connected: boolean;
   error?: string;
@@ -46,6 +60,7 @@ export interface UIElements {
 
 export interface ChatConfig {
   apiEndpoint: string;
+  streamEndpoint: string;
   maxMessageLength: number;
   reconnectAttempts: number;
   reconnectDelay: number;
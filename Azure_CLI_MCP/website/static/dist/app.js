@@ -47,6 +47,7 @@ class AzureChatApp {
     getConfig() {
         return {
             apiEndpoint: '/api/chat',
+            streamEndpoint: '/api/chat/stream',
             maxMessageLength: 2000,
             reconnectAttempts: 3,
             reconnectDelay: 5000,
@@ -12,7 +12,8 @@ export declare class ChatManager {
     private updateCharacterCount;
     private updateSendButton;
     private handleSendMessage;
-    private sendToAPI;
+    private sendToStreamAPI;
+    private renderMessageText;
     private addMessage;
     private createMessageElement;
     private formatMarkdown;
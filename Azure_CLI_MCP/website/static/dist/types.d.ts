@@ -22,6 +22,16 @@ export interface ChatResponse extends ApiResponse {
         message_id: string;
     };
 }
+export interface StreamDeltaEvent {
+    delta: string;
+}
+export interface StreamDoneEvent {
+    conversation_id: string;
+    message_id: string;
+}
+export interface StreamErrorEvent {
+    error: string;
+}
 export interface ConnectionStatus {
     connected: boolean;
     error?: string;
@@ -38,6 +48,7 @@ export interface UIElements {
 }
 export interface ChatConfig {
     apiEndpoint: string;
+    streamEndpoint: string;
     maxMessageLength: number;
     reconnectAttempts: number;
     reconnectDelay: number;
@@ -1,21 +1,21 @@
 #!/usr/bin/env python3
 """
-Flask web server for Azure CLI Chat Assistant
+Quart web server for Azure CLI Chat Assistant
 Serves the web interface and provides API endpoints for chat functionality
 Fixed to handle async operations properly with persistent chat history
 """
 
 import os
 import asyncio
-import json
-import threading
-import signal
 import sys
 import atexit
 from datetime import datetime
-from typing import Dict, Any, List
-from flask import Flask, request, jsonify, send_from_directory
-from flask_cors import CORS
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+from quart import Quart, Response, request, jsonify, send_from_directory
+from quart.json.provider import DefaultJSONProvider
+from quart_cors import cors
+from ulid import ULID
+import orjson
 import logging
 
 # Import the existing MCP client
@@ -39,30 +39,155 @@ logger.info("Azure CLI Chat Assistant Starting Up")
 logger.info(f"Log file: {os.path.abspath(log_file)}")
 logger.info("="*50)
 
-app = Flask(__name__, static_folder='website/static', static_url_path='')
-CORS(app)
+# Handlers await the MCP client directly on the serving event loop. Run with e.g.
+#   uvicorn website_app:app --loop uvloop --http httptools
+app = cors(Quart(__name__, static_folder='website/static', static_url_path=''))
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Route jsonify() and request.get_json() through orjson"""
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if kwargs.get('indent') else 0)
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+app.json = ORJSONProvider(app)
 
 # Global variables
 mcp_client: MCPClient = None
 chat_sessions: Dict[str, Any] = {}
-loop = None
+total_messages = 0  # Kept in step with chat_sessions so /api/status never re-counts
+# Set once load_chat_history() succeeds. Until then chat_sessions does not reflect what is
+# on disk, so writing it as the snapshot (and truncating the log) would lose history.
+history_loaded = False
 CHAT_HISTORY_FILE = 'chat_history.json'
 
+# Each chat message, and each cleared conversation, is appended to this log as one JSON
+# line. The snapshot in CHAT_HISTORY_FILE is only rewritten at startup and shutdown,
+# after which the log is truncated; on startup the log is replayed over the snapshot.
+CHAT_HISTORY_LOG = 'chat_history.jsonl'
+_history_log_fd: Optional[int] = None
+
+# Request handlers hand log records to history_queue and return; history_writer() appends
+# them to the log off the request path, up to HISTORY_BATCH_SIZE lines per write and fsync
+HISTORY_BATCH_SIZE = 64
+history_queue: Optional[asyncio.Queue] = None
+_history_writer: Optional[asyncio.Task] = None
+
+def message_log_record(conversation_id: str, message_pair: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the chat history log record for one message"""
+    return {
+        'cid': conversation_id,
+        'mid': message_pair['message_id'],
+        'ts': message_pair['timestamp'],
+        'u': message_pair['user_message'],
+        'a': message_pair['assistant_response']
+    }
+
+def clear_log_record(conversation_id: str) -> Dict[str, Any]:
+    """Build the chat history log record for a cleared conversation"""
+    return {'op': 'del', 'cid': conversation_id}
+
+def append_history_log(lines: bytes):
+    """Append encoded lines to the chat history log and flush them to disk"""
+    global _history_log_fd
+    if _history_log_fd is None:
+        _history_log_fd = os.open(CHAT_HISTORY_LOG, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    os.write(_history_log_fd, lines)
+    os.fsync(_history_log_fd)
+
+async def history_writer():
+    """Drain history_queue into the chat history log in batches"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await history_queue.get()]
+        while len(batch) < HISTORY_BATCH_SIZE and not history_queue.empty():
+            batch.append(history_queue.get_nowait())
+        try:
+            lines = b''.join(orjson.dumps(record) + b'\n' for record in batch)
+            await loop.run_in_executor(None, append_history_log, lines)
+        except Exception as e:
+            logger.error(f"Failed to append {len(batch)} messages to {CHAT_HISTORY_LOG}: {e}")
+        finally:
+            for _ in batch:
+                history_queue.task_done()
+
+def new_session(created_at: datetime) -> Dict[str, Any]:
+    """Create an empty chat session"""
+    created_at_iso = created_at.isoformat()
+    return {
+        'created_at': created_at,
+        'created_at_iso': created_at_iso,
+        'last_activity': created_at,
+        'last_activity_iso': created_at_iso,
+        'last_preview': "No messages",
+        'message_count': 0,
+        'messages': []
+    }
+
+def cache_session_fields(session: Dict[str, Any]):
+    """Precompute the ISO timestamps and preview the conversation endpoints serve"""
+    session.setdefault('last_activity', session['created_at'])
+    session['created_at_iso'] = session['created_at'].isoformat()
+    session['last_activity_iso'] = session['last_activity'].isoformat()
+    messages = session['messages']
+    session['last_preview'] = messages[-1]['user_message'][:100] + "..." if messages else "No messages"
+
+def replay_history_log(sessions: Dict[str, Any]) -> int:
+    """Apply logged messages and clears missing from the snapshot, returning how many were applied"""
+    # A crash between writing the snapshot and truncating the log leaves messages in both
+    seen = {m.get('message_id') for session in sessions.values() for m in session['messages']}
+    applied = 0
+    with open(CHAT_HISTORY_LOG, 'rb') as f:
+        for line in f:
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # A torn final line from an interrupted write
+                logger.warning("Skipping unreadable chat history log entry")
+                continue
+            
+            if record.get('op') == 'del':
+                session = sessions.pop(record['cid'], None)
+                if session is not None:
+                    # Message ids restart if the conversation id is reused, so forget the old ones
+                    seen.difference_update(m.get('message_id') for m in session['messages'])
+                applied += 1
+                continue
+            
+            if record['mid'] in seen:
+                continue
+            
+            timestamp = datetime.fromisoformat(record['ts'])
+            session = sessions.get(record['cid'])
+            if session is None:
+                session = sessions[record['cid']] = new_session(timestamp)
+            session['message_count'] += 1
+            session['last_activity'] = timestamp
+            session['messages'].append({
+                'timestamp': record['ts'],
+                'user_message': record['u'],
+                'assistant_response': record['a'],
+                'message_id': record['mid']
+            })
+            seen.add(record['mid'])
+            applied += 1
+    return applied
+
 def save_chat_history():
     """Save chat history to JSON file"""
     try:
-        # Convert datetime objects to ISO format strings for JSON serialization
-        serializable_sessions = {}
-        for session_id, session_data in chat_sessions.items():
-            serializable_data = session_data.copy()
-            if 'created_at' in serializable_data:
-                serializable_data['created_at'] = serializable_data['created_at'].isoformat()
-            if 'last_activity' in serializable_data:
-                serializable_data['last_activity'] = serializable_data['last_activity'].isoformat()
-            serializable_sessions[session_id] = serializable_data
+        # orjson writes the datetime fields as ISO 8601 itself, no conversion pass needed.
+        # Write then rename so a crash mid-save never leaves a torn snapshot.
+        tmp_file = f"{CHAT_HISTORY_FILE}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(orjson.dumps(chat_sessions, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        os.replace(tmp_file, CHAT_HISTORY_FILE)
         
-        with open(CHAT_HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(serializable_sessions, f, indent=2, ensure_ascii=False)
+        # Everything in the log is now in the snapshot
+        if os.path.exists(CHAT_HISTORY_LOG):
+            os.truncate(CHAT_HISTORY_LOG, 0)
         
         logger.info(f"Chat history saved to {CHAT_HISTORY_FILE} ({len(chat_sessions)} sessions)")
         return True
@@ -72,12 +197,13 @@ def save_chat_history():
 
 def load_chat_history():
     """Load chat history from JSON file"""
-    global chat_sessions
+    global chat_sessions, total_messages, history_loaded
     
     try:
+        loaded_sessions = {}
         if os.path.exists(CHAT_HISTORY_FILE):
-            with open(CHAT_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                loaded_sessions = json.load(f)
+            with open(CHAT_HISTORY_FILE, 'rb') as f:
+                loaded_sessions = orjson.loads(f.read())
             
             # Convert ISO format strings back to datetime objects
             for session_id, session_data in loaded_sessions.items():
@@ -90,71 +216,88 @@ def load_chat_history():
                 if 'messages' not in session_data:
                     session_data['messages'] = []
             
-            chat_sessions = loaded_sessions
-            logger.info(f"Chat history loaded from {CHAT_HISTORY_FILE} ({len(chat_sessions)} sessions)")
-            
-            # Log summary of loaded sessions
-            total_messages = sum(len(session.get('messages', [])) for session in chat_sessions.values())
-            logger.info(f"Total messages loaded: {total_messages}")
-            
+            logger.info(f"Chat history loaded from {CHAT_HISTORY_FILE} ({len(loaded_sessions)} sessions)")
         else:
             logger.info(f"No existing chat history file found at {CHAT_HISTORY_FILE}")
-            chat_sessions = {}
+        
+        has_log = os.path.exists(CHAT_HISTORY_LOG) and os.path.getsize(CHAT_HISTORY_LOG)
+        if has_log:
+            replayed = replay_history_log(loaded_sessions)
+            logger.info(f"Replayed {replayed} messages from {CHAT_HISTORY_LOG}")
+        
+        for session_data in loaded_sessions.values():
+            cache_session_fields(session_data)
+        
+        chat_sessions = loaded_sessions
+        
+        # Log summary of loaded sessions
+        total_messages = sum(len(session['messages']) for session in chat_sessions.values())
+        logger.info(f"Total messages loaded: {total_messages}")
+        history_loaded = True
+        
+        if has_log:
+            # Fold the log into a fresh snapshot so new appends start from an empty file
+            save_chat_history()
             
     except Exception as e:
         logger.error(f"Failed to load chat history: {e}")
         chat_sessions = {}
+        total_messages = 0
 
-def cleanup_and_exit(signum=None, frame=None):
+def cleanup_and_exit():
     """Cleanup function called on exit"""
     logger.info("Cleaning up and saving chat history before exit...")
     
-    # Save chat history
-    if save_chat_history():
+    # Save chat history, unless it was never loaded (e.g. the module was only imported)
+    if not history_loaded:
+        logger.warning("Chat history was not loaded, leaving the files on disk untouched")
+    elif save_chat_history():
         logger.info("Chat history saved successfully")
     else:
         logger.error("Failed to save chat history on exit")
     
-    # Close MCP client if connected
-    global mcp_client
-    if mcp_client and hasattr(mcp_client, 'session') and mcp_client.session:
-        try:
-            # Note: We can't easily close async session here, but it should cleanup automatically
-            logger.info("MCP client cleanup noted")
-        except Exception as e:
-            logger.error(f"Error during MCP client cleanup: {e}")
-    
     logger.info("Cleanup complete")
-    
-    # Exit if called by signal
-    if signum is not None:
-        sys.exit(0)
 
-# Register cleanup function for various exit scenarios
+# Save chat history however the process exits. The ASGI server handles SIGINT/SIGTERM
+# itself and runs the after_serving hook, which also closes the MCP client.
 atexit.register(cleanup_and_exit)
-signal.signal(signal.SIGINT, cleanup_and_exit)  # Ctrl+C
-signal.signal(signal.SIGTERM, cleanup_and_exit)  # Termination signal
 
 def get_or_create_session_id() -> str:
-    """Generate a unique session ID for conversation tracking"""
-    import uuid
-    return str(uuid.uuid4())
+    """Generate a unique, time-ordered session ID for conversation tracking"""
+    return str(ULID())
 
-def run_async_in_thread(coro):
-    """Run async function in the event loop thread"""
-    global loop
-    if loop is None:
-        return None
+def record_message(conversation_id: str, message: str, response: str) -> Dict[str, Any]:
+    """Add a message and its response to the session history and queue it for the log"""
+    global total_messages
     
-    future = asyncio.run_coroutine_threadsafe(coro, loop)
-    try:
-        return future.result(timeout=30)  # 30 second timeout
-    except asyncio.TimeoutError:
-        logger.error("Async operation timed out")
-        return None
-    except Exception as e:
-        logger.error(f"Error in async operation: {e}")
-        return None
+    # Update session with the new message and response
+    session = chat_sessions[conversation_id]
+    timestamp = datetime.utcnow()
+    timestamp_iso = timestamp.isoformat()
+    session['message_count'] += 1
+    session['last_activity'] = timestamp
+    session['last_activity_iso'] = timestamp_iso
+    session['last_preview'] = message[:100] + "..."
+    
+    # Store the message and response in history
+    message_pair = {
+        'timestamp': timestamp_iso,
+        'user_message': message,
+        'assistant_response': response,
+        'message_id': f"{conversation_id}_{session['message_count']}"
+    }
+    
+    session['messages'].append(message_pair)
+    total_messages += 1
+    
+    # Queue just this message for the background history log writer
+    history_queue.put_nowait(message_log_record(conversation_id, message_pair))
+    return message_pair
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events frame"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {orjson.dumps(data).decode()}\n\n"
 
 async def initialize_mcp_client():
     """Initialize the MCP client connection"""
@@ -162,7 +305,13 @@ async def initialize_mcp_client():
     try:
         logger.info("Initializing MCP client...")
         mcp_client = MCPClient()
-        await mcp_client.connect_to_azure_cli_server()
+        # Prime the Claude connection pool while the MCP server starts up. The MCP
+        # connection stays in this task so its contexts are exited where they were entered.
+        warm_up = asyncio.create_task(mcp_client.warm_up())
+        try:
+            await mcp_client.connect_to_azure_cli_server()
+        finally:
+            await warm_up
         logger.info("MCP client initialized successfully")
         return True
     except Exception as e:
@@ -170,13 +319,13 @@ async def initialize_mcp_client():
         return False
 
 @app.route('/')
-def index():
+async def index():
     """Serve the main chat interface"""
     logger.info("Serving main chat interface")
-    return send_from_directory('website/static', 'index.html')
+    return await send_from_directory('website/static', 'index.html')
 
 @app.route('/health')
-def health_check():
+async def health_check():
     """Health check endpoint"""
     global mcp_client
     is_healthy = mcp_client is not None and mcp_client.session is not None
@@ -188,13 +337,13 @@ def health_check():
     }), 200 if is_healthy else 503
 
 @app.route('/api/chat', methods=['POST'])
-def chat():
+async def chat():
     """Handle chat messages and return responses"""
     global mcp_client, chat_sessions
     
     try:
         # Parse request
-        data = request.get_json()
+        data = await request.get_json()
         if not data or 'message' not in data:
             logger.warning("Chat request missing message")
             return jsonify({
@@ -215,11 +364,7 @@ def chat():
         
         # Initialize session if needed
         if conversation_id not in chat_sessions:
-            chat_sessions[conversation_id] = {
-                'created_at': datetime.utcnow(),
-                'message_count': 0,
-                'messages': []
-            }
+            chat_sessions[conversation_id] = new_session(datetime.utcnow())
             logger.info(f"Created new chat session: {conversation_id}")
         
         # Check if MCP client is available
@@ -234,8 +379,12 @@ def chat():
         logger.info(f"Processing message for conversation {conversation_id}: {message[:100]}...")
         
         try:
-            # Run the async operation with iterative tool processing
-            response = run_async_in_thread(process_query_with_iterative_tools(mcp_client, message))
+            # Run the iterative tool processing on this event loop
+            try:
+                response = await asyncio.wait_for(process_query_with_iterative_tools(mcp_client, message), timeout=30)
+            except asyncio.TimeoutError:
+                logger.error("Async operation timed out")
+                response = None
             
             if response is None:
                 logger.error("Failed to get response from MCP client")
@@ -244,23 +393,7 @@ def chat():
                     'error': 'Failed to process your request - operation timed out or failed'
                 }), 500
             
-            # Update session with the new message and response
-            timestamp = datetime.utcnow()
-            chat_sessions[conversation_id]['message_count'] += 1
-            chat_sessions[conversation_id]['last_activity'] = timestamp
-            
-            # Store the message and response in history
-            message_pair = {
-                'timestamp': timestamp.isoformat(),
-                'user_message': message,
-                'assistant_response': response,
-                'message_id': f"{conversation_id}_{chat_sessions[conversation_id]['message_count']}"
-            }
-            
-            chat_sessions[conversation_id]['messages'].append(message_pair)
-            
-            # Save chat history after each message
-            save_chat_history()
+            message_pair = record_message(conversation_id, message, response)
             
             logger.info(f"Successfully processed message {message_pair['message_id']}, response length: {len(response)} chars")
             
@@ -287,6 +420,149 @@ def chat():
             'error': 'Internal server error'
         }), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Handle chat messages and stream the response as Server-Sent Events"""
+    global mcp_client, chat_sessions
+    
+    data = await request.get_json(silent=True)
+    if not data or 'message' not in data:
+        logger.warning("Chat stream request missing message")
+        return jsonify({
+            'success': False,
+            'error': 'Message is required'
+        }), 400
+    
+    message = data['message'].strip()
+    if not message:
+        logger.warning("Chat stream request with empty message")
+        return jsonify({
+            'success': False,
+            'error': 'Message cannot be empty'
+        }), 400
+    
+    if not mcp_client or not mcp_client.session:
+        logger.error("MCP client not available for chat stream request")
+        return jsonify({
+            'success': False,
+            'error': 'Azure CLI service is not available. Please check your connection.'
+        }), 503
+    
+    conversation_id = data.get('conversation_id', get_or_create_session_id())
+    if conversation_id not in chat_sessions:
+        chat_sessions[conversation_id] = new_session(datetime.utcnow())
+        logger.info(f"Created new chat session: {conversation_id}")
+    
+    logger.info(f"Streaming message for conversation {conversation_id}: {message[:100]}...")
+    
+    async def generate():
+        chunks = []
+        error = None
+        message_pair = None
+        query = stream_query_with_iterative_tools(mcp_client, message)
+        try:
+            async for kind, payload in query:
+                if kind == 'text':
+                    chunks.append(payload)
+                    yield sse_event({'delta': payload})
+                elif kind == 'error':
+                    error = payload
+                    yield sse_event({'error': payload}, event='error')
+                else:
+                    yield sse_event(payload, event=kind)
+        finally:
+            # A client disconnect cancels or closes this generator; close the query now too so
+            # its own cleanup (results for any in-flight tool calls) runs before we record
+            await query.aclose()
+            
+            # Persist once the stream closes, even if the client went away mid-response
+            response = error if error is not None else ''.join(chunks)
+            if response:
+                message_pair = record_message(conversation_id, message, response)
+                logger.info(f"Successfully streamed message {message_pair['message_id']}, response length: {len(response)} chars")
+        
+        if message_pair:
+            yield sse_event({
+                'conversation_id': conversation_id,
+                'message_id': message_pair['message_id']
+            }, event='done')
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Prompt cache breakpoints. Each tool round-trip re-sends the whole conversation, so
+# marking the tool definitions and the newest message lets Claude reuse the prefix.
+PROMPT_CACHE = {"type": "ephemeral"}
+
+def with_tools_cache_breakpoint(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return the tool definitions with a cache breakpoint after the last one"""
+    if not tools:
+        return tools
+    return [*tools[:-1], {**tools[-1], "cache_control": PROMPT_CACHE}]
+
+def with_history_cache_breakpoint(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return the messages with a cache breakpoint on the newest block, leaving the history untouched"""
+    if not messages:
+        return messages
+    last = messages[-1]
+    content = last["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content, "cache_control": PROMPT_CACHE}]
+    elif content and isinstance(content[-1], dict):
+        content = [*content[:-1], {**content[-1], "cache_control": PROMPT_CACHE}]
+    else:
+        return messages
+    return [*messages[:-1], {**last, "content": content}]
+
+# Tool calls from one Claude response run concurrently, at most TOOL_CONCURRENCY at a
+# time, and each gets TOOL_TIMEOUT seconds so one hung Azure CLI call cannot stall the rest
+TOOL_CONCURRENCY = 8
+TOOL_TIMEOUT = 20
+
+async def execute_tool(mcp_client, tool_use, position: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+    """Run one tool call and wrap its output, or the error, as a tool_result block"""
+    try:
+        async with semaphore:
+            logger.info(f"Executing tool {position}: {tool_use.name}")
+            result = await asyncio.wait_for(mcp_client.session.call_tool(tool_use.name, tool_use.input), timeout=TOOL_TIMEOUT)
+        
+        # Extract content properly from MCP result
+        if hasattr(result, 'content'):
+            if isinstance(result.content, list):
+                content_text = ""
+                for content_item in result.content:
+                    if hasattr(content_item, 'text'):
+                        content_text += content_item.text
+                    else:
+                        content_text += str(content_item)
+            else:
+                content_text = str(result.content)
+        else:
+            content_text = str(result)
+        
+        logger.info(f"Tool {tool_use.name} executed successfully, result length: {len(content_text)}")
+        
+        return {
+            "type": "tool_result",
+            "tool_use_id": tool_use.id,
+            "content": content_text
+        }
+        
+    except asyncio.TimeoutError:
+        logger.error(f"Tool {tool_use.name} timed out after {TOOL_TIMEOUT}s")
+        return {
+            "type": "tool_result",
+            "tool_use_id": tool_use.id,
+            "content": f"Error executing tool: timed out after {TOOL_TIMEOUT} seconds"
+        }
+    except Exception as e:
+        logger.error(f"Error executing tool {tool_use.name}: {str(e)}")
+        return {
+            "type": "tool_result", 
+            "tool_use_id": tool_use.id,
+            "content": f"Error executing tool: {str(e)}"
+        }
+
 async def process_query_with_iterative_tools(mcp_client, query: str, safety_limit: int = 100) -> str:
     """
     Process a query with unlimited iterative tool call handling.
@@ -300,182 +576,179 @@ async def process_query_with_iterative_tools(mcp_client, query: str, safety_limi
     Returns:
         The final response string
     """
+    # Collect the streamed output into one string
+    chunks = []
+    stream = stream_query_with_iterative_tools(mcp_client, query, safety_limit)
     try:
-        logger.info(f"Starting unlimited iterative tool processing for query: '{query[:100]}...'")
-        
-        # Add the new user message to conversation history
-        mcp_client.conversation_history.append({
-            "role": "user", 
-            "content": query
-        })
-
-        # Get available tools
-        response = await mcp_client.session.list_tools()
-        available_tools = [{
-            "name": tool.name,
-            "description": tool.description,
-            "input_schema": tool.inputSchema
-        } for tool in response.tools]
-        
-        logger.info(f"Available tools: {[tool['name'] for tool in available_tools]}")
-
-        iteration = 0
-        final_text = []
-        consecutive_no_tool_responses = 0
-        tool_execution_history = []  # Track tool execution for loop detection
-        
-        while True:
-            iteration += 1
-            logger.info(f"Tool processing iteration {iteration}")
+        async for kind, payload in stream:
+            if kind == 'text':
+                chunks.append(payload)
+            elif kind == 'error':
+                return payload
+    finally:
+        # Release the query lock even when returning before the stream is exhausted
+        await stream.aclose()
+    return ''.join(chunks)
+
+async def stream_query_with_iterative_tools(mcp_client, query: str, safety_limit: int = 100) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Process a query like process_query_with_iterative_tools, yielding output as Claude streams it.
+    
+    Yields ("text", delta) for response text, with a newline between text blocks,
+    ("tool_use", {...}) for each tool call and ("error", message) if processing fails outright.
+    """
+    # mcp_client.conversation_history is shared by every request, so run one query at a time
+    async with mcp_client.query_lock:
+        try:
+            logger.info(f"Starting unlimited iterative tool processing for query: '{query[:100]}...'")
             
-            # Safety check - emergency brake for infinite loops
-            if iteration > safety_limit:
-                logger.error(f"Emergency stop: Reached safety limit of {safety_limit} iterations")
-                final_text.append(f"\n\n[Emergency Stop: Reached safety limit of {safety_limit} iterations]")
-                break
+            # Add the new user message to conversation history
+            mcp_client.conversation_history.append({
+                "role": "user", 
+                "content": query
+            })
+
+            # Get available tools, re-listed from the MCP server at most every few minutes
+            available_tools = await mcp_client.get_tools()
             
-            # Call Claude API
+            logger.info(f"Available tools: {[tool['name'] for tool in available_tools]}")
+            available_tools = with_tools_cache_breakpoint(available_tools)
+
+            # Summarize older turns once per query. The tool round-trips below only extend
+            # the current turn, which compaction always keeps verbatim, so re-checking
+            # between iterations could never free anything.
             try:
-                response = mcp_client.anthropic.messages.create(
-                    model="claude-3-5-sonnet-20241022",
-                    max_tokens=1000,
-                    messages=mcp_client.conversation_history,
-                    tools=available_tools
-                )
+                await mcp_client.compact_history()
             except Exception as e:
-                logger.error(f"Error calling Claude API in iteration {iteration}: {str(e)}")
-                final_text.append(f"\n\n[Error: Claude API call failed in iteration {iteration}: {str(e)}]")
-                break
-            
-            logger.info(f"Claude response - content blocks: {len(response.content)}, stop reason: {response.stop_reason}")
-            
-            # Check if the response contains tool calls
-            tool_uses = [content for content in response.content if content.type == 'tool_use']
-            text_content = [content for content in response.content if content.type == 'text']
-            
-            logger.info(f"Iteration {iteration}: Found {len(tool_uses)} tool calls and {len(text_content)} text blocks")
-            
-            # Add any text content to final output
-            for content in text_content:
-                final_text.append(content.text)
+                logger.warning(f"Could not compact conversation history: {str(e)}")
 
-            if tool_uses:
-                # Reset consecutive no-tool counter
-                consecutive_no_tool_responses = 0
-                
-                logger.info(f"Processing {len(tool_uses)} tool calls in iteration {iteration}")
-                
-                # Track tool calls for potential loop detection
-                iteration_tools = [f"{tool_use.name}({json.dumps(tool_use.input, sort_keys=True)})" for tool_use in tool_uses]
-                tool_execution_history.append(iteration_tools)
-                
-                # Simple loop detection - check if we're repeating the exact same tool calls
-                if len(tool_execution_history) >= 3:
-                    # Check last 3 iterations for identical tool patterns
-                    recent_patterns = tool_execution_history[-3:]
-                    if recent_patterns[0] == recent_patterns[1] == recent_patterns[2]:
-                        logger.warning(f"Detected potential infinite loop: same tools called 3 times in a row")
-                        final_text.append(f"\n\n[Warning: Detected potential infinite loop - stopping to prevent endless execution]")
-                        break
-                
-                # Add the assistant's response (with tool uses) to conversation history
-                mcp_client.conversation_history.append({
-                    "role": "assistant",
-                    "content": response.content
-                })
+            iteration = 0
+            has_output = False  # Text blocks are separated by a newline once anything was yielded
+            tool_execution_history = []  # Track tool execution for loop detection
+            
+            while True:
+                iteration += 1
+                logger.info(f"Tool processing iteration {iteration}")
                 
-                # Execute all tool calls and collect results
-                tool_results = []
-                for i, tool_use in enumerate(tool_uses):
-                    try:
-                        logger.info(f"Executing tool {i+1}/{len(tool_uses)}: {tool_use.name}")
-                        
-                        result = await mcp_client.session.call_tool(tool_use.name, tool_use.input)
-                        
-                        # Extract content properly from MCP result
-                        if hasattr(result, 'content'):
-                            if isinstance(result.content, list):
-                                content_text = ""
-                                for content_item in result.content:
-                                    if hasattr(content_item, 'text'):
-                                        content_text += content_item.text
-                                    else:
-                                        content_text += str(content_item)
-                            else:
-                                content_text = str(result.content)
-                        else:
-                            content_text = str(result)
-                        
-                        logger.info(f"Tool {tool_use.name} executed successfully, result length: {len(content_text)}")
-                        
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": tool_use.id,
-                            "content": content_text
-                        })
-                        
-                    except Exception as e:
-                        logger.error(f"Error executing tool {tool_use.name}: {str(e)}")
-                        tool_results.append({
-                            "type": "tool_result", 
-                            "tool_use_id": tool_use.id,
-                            "content": f"Error executing tool: {str(e)}"
-                        })
+                # Safety check - emergency brake for infinite loops
+                if iteration > safety_limit:
+                    logger.error(f"Emergency stop: Reached safety limit of {safety_limit} iterations")
+                    yield "text", ("\n" if has_output else "") + f"\n\n[Emergency Stop: Reached safety limit of {safety_limit} iterations]"
+                    break
                 
-                # Add all tool results as a single user message
-                mcp_client.conversation_history.append({
-                    "role": "user",
-                    "content": tool_results
-                })
+                # Call Claude API, passing text through as it arrives
+                try:
+                    async with mcp_client.anthropic.messages.stream(
+                        model="claude-3-5-sonnet-20241022",
+                        max_tokens=1000,
+                        messages=with_history_cache_breakpoint(mcp_client.conversation_history),
+                        tools=available_tools
+                    ) as stream:
+                        async for event in stream:
+                            if event.type == "content_block_start" and event.content_block.type == "text":
+                                if has_output:
+                                    yield "text", "\n"
+                                has_output = True
+                            elif event.type == "text":
+                                yield "text", event.text
+                        response = await stream.get_final_message()
+                except Exception as e:
+                    logger.error(f"Error calling Claude API in iteration {iteration}: {str(e)}")
+                    yield "text", ("\n" if has_output else "") + f"\n\n[Error: Claude API call failed in iteration {iteration}: {str(e)}]"
+                    break
                 
-                # Continue to next iteration to process potential additional tool calls
-                logger.info(f"Iteration {iteration} complete, checking for additional tool calls...")
+                logger.info(f"Claude response - content blocks: {len(response.content)}, stop reason: {response.stop_reason}")
                 
-            else:
-                # No tool calls found
-                consecutive_no_tool_responses += 1
-                logger.info(f"No tool calls found in iteration {iteration}, consecutive no-tool responses: {consecutive_no_tool_responses}")
+                # Check if the response contains tool calls
+                tool_uses = [content for content in response.content if content.type == 'tool_use']
                 
-                # If we get multiple consecutive responses with no tool calls, we're likely done
-                if consecutive_no_tool_responses >= 2:
-                    logger.info(f"Processing complete: {consecutive_no_tool_responses} consecutive responses with no tool calls")
+                logger.info(f"Iteration {iteration}: Found {len(tool_uses)} tool calls and {len(response.content) - len(tool_uses)} other blocks")
+
+                if tool_uses:
+                    logger.info(f"Processing {len(tool_uses)} tool calls in iteration {iteration}")
                     
-                    # Add the final response to conversation history
+                    # Track tool calls for potential loop detection
+                    iteration_tools = [f"{tool_use.name}({orjson.dumps(tool_use.input, option=orjson.OPT_SORT_KEYS).decode()})" for tool_use in tool_uses]
+                    tool_execution_history.append(iteration_tools)
+                    
+                    # Simple loop detection - check if we're repeating the exact same tool calls
+                    if len(tool_execution_history) >= 3:
+                        # Check last 3 iterations for identical tool patterns
+                        recent_patterns = tool_execution_history[-3:]
+                        if recent_patterns[0] == recent_patterns[1] == recent_patterns[2]:
+                            logger.warning(f"Detected potential infinite loop: same tools called 3 times in a row")
+                            yield "text", ("\n" if has_output else "") + f"\n\n[Warning: Detected potential infinite loop - stopping to prevent endless execution]"
+                            break
+                    
+                    for tool_use in tool_uses:
+                        yield "tool_use", {"name": tool_use.name, "input": tool_use.input}
+                    
+                    # Add the assistant's response (with tool uses) to conversation history
                     mcp_client.conversation_history.append({
                         "role": "assistant",
                         "content": response.content
                     })
                     
-                    break
+                    # Execute the tool calls concurrently; gather keeps the results in call order
+                    semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+                    tool_results = None
+                    try:
+                        tool_results = await asyncio.gather(*(
+                            execute_tool(mcp_client, tool_use, f"{i+1}/{len(tool_uses)}", semaphore)
+                            for i, tool_use in enumerate(tool_uses)
+                        ))
+                    finally:
+                        if tool_results is None:
+                            # Cancelled mid-call (request timeout or client disconnect). The shared
+                            # history still needs a result for every tool_use or later requests fail.
+                            logger.warning(f"Tool execution cancelled in iteration {iteration}")
+                            tool_results = [{
+                                "type": "tool_result",
+                                "tool_use_id": tool_use.id,
+                                "content": "Error executing tool: the request was cancelled"
+                            } for tool_use in tool_uses]
+                        
+                        # Add all tool results as a single user message
+                        mcp_client.conversation_history.append({
+                            "role": "user",
+                            "content": tool_results
+                        })
+                    
+                    # Continue to next iteration to process potential additional tool calls
+                    logger.info(f"Iteration {iteration} complete, checking for additional tool calls...")
+                    
                 else:
-                    # Add the response to conversation history and continue one more iteration
-                    # Sometimes Claude might provide analysis between tool calls
+                    # No tool calls: stop_reason says whether Claude is finished
                     mcp_client.conversation_history.append({
                         "role": "assistant",
                         "content": response.content
                     })
-                    logger.info("Continuing for one more iteration to ensure no additional tool calls are needed...")
-        
-        result = "\n".join(final_text)
-        logger.info(f"Unlimited iterative tool processing complete after {iteration} iterations, final result length: {len(result)}")
-        logger.info(f"Tool execution summary: {len(tool_execution_history)} iterations with tool calls")
-        
-        return result
-        
-    except Exception as e:
-        logger.error(f"Error in unlimited iterative tool processing: {str(e)}")
-        return f"Error processing query with unlimited iterative tools: {str(e)}"
+                    
+                    if response.stop_reason == "tool_use":
+                        # Degenerate case, Claude reported a tool call but sent none
+                        logger.warning(f"Iteration {iteration} stopped for tool use without any tool calls, asking again...")
+                        continue
+                    
+                    logger.info(f"Processing complete: no tool calls, stop reason: {response.stop_reason}")
+                    break
+            
+            logger.info(f"Unlimited iterative tool processing complete after {iteration} iterations")
+            logger.info(f"Tool execution summary: {len(tool_execution_history)} iterations with tool calls")
+            
+        except Exception as e:
+            logger.error(f"Error in unlimited iterative tool processing: {str(e)}")
+            yield "error", f"Error processing query with unlimited iterative tools: {str(e)}"
 
 @app.route('/api/conversations/<conversation_id>', methods=['DELETE'])
-def clear_conversation(conversation_id: str):
+async def clear_conversation(conversation_id: str):
     """Clear a specific conversation"""
-    global chat_sessions
+    global chat_sessions, total_messages
     
     if conversation_id in chat_sessions:
-        del chat_sessions[conversation_id]
+        total_messages -= len(chat_sessions.pop(conversation_id)['messages'])
         logger.info(f"Cleared conversation {conversation_id}")
-        # Save after clearing
-        save_chat_history()
+        # Log the removal; the snapshot picks it up at the next startup or shutdown
+        history_queue.put_nowait(clear_log_record(conversation_id))
     
     return jsonify({
         'success': True,
@@ -483,7 +756,7 @@ def clear_conversation(conversation_id: str):
     })
 
 @app.route('/api/conversations/<conversation_id>', methods=['GET'])
-def get_conversation_history(conversation_id: str):
+async def get_conversation_history(conversation_id: str):
     """Get conversation history for a specific conversation"""
     global chat_sessions
     
@@ -498,30 +771,26 @@ def get_conversation_history(conversation_id: str):
         'success': True,
         'data': {
             'conversation_id': conversation_id,
-            'created_at': session['created_at'].isoformat(),
-            'last_activity': session.get('last_activity', session['created_at']).isoformat(),
+            'created_at': session['created_at_iso'],
+            'last_activity': session['last_activity_iso'],
             'message_count': session['message_count'],
-            'messages': session.get('messages', [])
+            'messages': session['messages']
         }
     })
 
 @app.route('/api/conversations', methods=['GET'])
-def list_conversations():
+async def list_conversations():
     """List all conversations with metadata"""
     global chat_sessions
     
-    conversations = []
-    for conv_id, session in chat_sessions.items():
-        conversations.append({
-            'conversation_id': conv_id,
-            'created_at': session['created_at'].isoformat(),
-            'last_activity': session.get('last_activity', session['created_at']).isoformat(),
-            'message_count': session['message_count'],
-            'preview': session.get('messages', [])[-1]['user_message'][:100] + "..." if session.get('messages') else "No messages"
-        })
-    
-    # Sort by last activity (most recent first)
-    conversations.sort(key=lambda x: x['last_activity'], reverse=True)
+    # Sort by last activity (most recent first), comparing the datetimes directly
+    conversations = [{
+        'conversation_id': conv_id,
+        'created_at': session['created_at_iso'],
+        'last_activity': session['last_activity_iso'],
+        'message_count': session['message_count'],
+        'preview': session['last_preview']
+    } for conv_id, session in sorted(chat_sessions.items(), key=lambda item: item[1]['last_activity'], reverse=True)]
     
     return jsonify({
         'success': True,
@@ -532,9 +801,9 @@ def list_conversations():
     })
 
 @app.route('/api/status')
-def get_status():
+async def get_status():
     """Get detailed system status"""
-    global mcp_client, chat_sessions
+    global mcp_client, chat_sessions, total_messages
     
     mcp_status = {
         'connected': mcp_client is not None and mcp_client.session is not None,
@@ -544,9 +813,6 @@ def get_status():
     if mcp_client and hasattr(mcp_client, 'conversation_history'):
         mcp_status['conversation_length'] = len(mcp_client.conversation_history)
     
-    # Calculate total messages
-    total_messages = sum(len(session.get('messages', [])) for session in chat_sessions.values())
-    
     logger.info(f"Status request: {len(chat_sessions)} active sessions, {total_messages} total messages, MCP connected: {mcp_status['connected']}")
     
     return jsonify({
@@ -561,19 +827,19 @@ def get_status():
 
 # Static file serving
 @app.route('/<path:filename>')
-def serve_static(filename):
+async def serve_static(filename):
     """Serve static files"""
     logger.debug(f"Serving static file: {filename}")
-    return send_from_directory('website/static', filename)
+    return await send_from_directory('website/static', filename)
 
 @app.route('/favicon.ico')
-def favicon():
+async def favicon():
     """Serve favicon"""
-    return send_from_directory('website/static', 'favicon.ico')
+    return await send_from_directory('website/static', 'favicon.ico')
 
 # Error handlers
 @app.errorhandler(404)
-def not_found(error):
+async def not_found(error):
     logger.warning(f"404 error: {request.url}")
     return jsonify({
         'success': False,
@@ -581,17 +847,24 @@ def not_found(error):
     }), 404
 
 @app.errorhandler(500)
-def internal_error(error):
+async def internal_error(error):
     logger.error(f"500 error: {error}")
     return jsonify({
         'success': False,
         'error': 'Internal server error'
     }), 500
 
+@app.before_serving
 async def async_startup():
     """Initialize the async components"""
+    global history_queue, _history_writer
     logger.info("Starting Azure CLI Chat Assistant async components...")
     
+    # Load existing chat history and start the log writer
+    load_chat_history()
+    history_queue = asyncio.Queue()
+    _history_writer = asyncio.create_task(history_writer())
+    
     # Initialize MCP client
     success = await initialize_mcp_client()
     if not success:
@@ -599,38 +872,28 @@ async def async_startup():
     
     logger.info("Application async startup complete")
 
-def startup_async_loop():
-    """Start the async event loop in a separate thread"""
-    global loop
-    logger.info("Starting async event loop thread...")
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(async_startup())
+@app.after_serving
+async def async_shutdown():
+    """Flush queued history and close the MCP client on the event loop that opened it"""
+    # Let the writer finish before cleanup_and_exit() writes the snapshot
+    if _history_writer:
+        await history_queue.join()
+        _history_writer.cancel()
     
-    # Keep the loop running to handle async operations
-    logger.info("Async event loop running")
-    loop.run_forever()
+    if mcp_client:
+        await mcp_client.cleanup()
+        logger.info("MCP client closed")
 
 def main():
     """Main entry point"""
-    import sys
-    
     logger.info("Azure CLI Chat Assistant main() starting...")
     
-    # Load existing chat history
-    load_chat_history()
-    
-    # Start the async event loop in a separate thread
-    async_thread = threading.Thread(target=startup_async_loop, daemon=True)
-    async_thread.start()
-    logger.info("Started async thread")
-    
-    # Give the async thread time to initialize
-    import time
-    logger.info("Waiting for async initialization...")
-    time.sleep(2)
+    # Use uvloop for the serving event loop where it is available
+    if not sys.platform.startswith('win'):
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     
-    # Start the Flask app
+    # Start the Quart app; async_startup() runs on its event loop before serving
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('DEBUG', 'False').lower() == 'true'
     
@@ -640,7 +903,7 @@ def main():
     logger.info(f"Debug mode: {debug}")
     
     try:
-        app.run(host='0.0.0.0', port=port, debug=debug, threaded=True)
+        app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=debug)
     except KeyboardInterrupt:
         logger.info("Received keyboard interrupt")
         cleanup_and_exit()